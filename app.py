@@ -1,8 +1,19 @@
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
+try:
+    from numba import njit
+except Exception:  # numba가 없으면 순수 파이썬 경로로 동작
+    njit = None
+
 # --- 페이지 기본 설정 ---
 st.set_page_config(
     page_title="부동산 지수 사분면 분석",
@@ -10,59 +21,197 @@ st.set_page_config(
     layout="wide"
 )
 
-@st.cache_data
-def load_data(file_path):
+def _read_sheet(file_path, sheet_name):
+    # calamine(Rust) 엔진은 openpyxl의 XML DOM 방식보다 훨씬 빠르고 가벼움
     try:
-        sale = pd.read_excel(file_path, sheet_name="3.매매지수", skiprows=[0, 2, 3])
-        rent = pd.read_excel(file_path, sheet_name="4.전세지수", skiprows=[0, 2, 3])
-    except Exception as e:
-        st.error(f"오류 발생: {e}")
-        st.stop()
-
-    sale = sale.dropna(subset=['구분'])
-    sale[:] = sale[:].fillna(0).infer_objects(copy=False)
-    rent[:] = rent[:].fillna(0).infer_objects(copy=False)
-
-    sale.rename(columns={'구분': '날짜'}, inplace=True)
-    rent.rename(columns={'구분': '날짜'}, inplace=True)
-
-    sale_melt = sale.melt(id_vars=['날짜'], var_name='지역', value_name='매매지수')
-    rent_melt = rent.melt(id_vars=['날짜'], var_name='지역', value_name='전세지수')
-
-    df = pd.merge(sale_melt, rent_melt, on=['날짜', '지역'])
+        return pd.read_excel(file_path, sheet_name=sheet_name,
+                             skiprows=[0, 2, 3], engine="calamine")
+    except ImportError:
+        # python-calamine 미설치 환경에서도 기본 엔진으로 동작하게 함
+        return pd.read_excel(file_path, sheet_name=sheet_name,
+                             skiprows=[0, 2, 3])
+
+@st.cache_resource
+def _parse_sheets(file_path):
+    # 네 개 시트의 파싱을 스레드로 겹쳐 콜드 스타트 시간을 줄임
+    # (calamine 핸들은 스레드 간 공유가 안 되므로 시트마다 독립적으로 엶)
+    names = ["3.매매지수", "4.전세지수", "1.매매증감", "2.전세증감"]
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        frames = list(ex.map(lambda n: _read_sheet(file_path, n), names))
+    return dict(zip(names, frames))
+
+def _fill_numeric(frame):
+    # 숫자 열만 골라 결측을 채움 — infer_objects를 동반한 전체 프레임 복사 두 번을 피함
+    frame = frame.copy()
+    num_cols = frame.columns.difference(['구분'])
+    frame[num_cols] = frame[num_cols].fillna(0).astype('float32')
+    return frame
+
+def _melt_pair(sheets, sale_name, rent_name, value_names):
+    sale = _fill_numeric(sheets[sale_name].dropna(subset=['구분']))
+    rent = _fill_numeric(sheets[rent_name].dropna(subset=['구분']))
+
+    sale = sale.rename(columns={'구분': '날짜'})
+    rent = rent.rename(columns={'구분': '날짜'})
+
+    # 두 시트의 축이 완전히 같으면 조인/정렬 없이 값 열만 이어붙임
+    df = sale.melt(id_vars=['날짜'], var_name='지역', value_name=value_names[0])
+    if sale.columns.equals(rent.columns) and sale['날짜'].equals(rent['날짜']):
+        df[value_names[1]] = rent.melt(
+            id_vars=['날짜'], var_name='지역',
+            value_name=value_names[1])[value_names[1]].to_numpy()
+    else:
+        # 축이 어긋난 워크북이면 안전하게 merge로 폴백
+        r_melt = rent.melt(id_vars=['날짜'], var_name='지역', value_name=value_names[1])
+        df = pd.merge(df, r_melt, on=['날짜', '지역'])
     df['날짜'] = pd.to_datetime(df['날짜'])
+    # 지수 표시에는 float32 정밀도면 충분하고, 지역은 고유값이 적어 category가 유리
+    df['지역'] = df['지역'].astype('category')
+    for col in value_names:
+        df[col] = df[col].astype('float32')
     return df
 #++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 @st.cache_data
-def load_change_data(file_path):
+def load_all(file_path):
+    # 지수/증감 데이터를 한 번의 워크북 파싱으로 모두 생성
     try:
-        # 증감 시트는 보통 '매매증감', '전세증감'으로 명명됨 (시트명 확인 필요)
-        sale_chg = pd.read_excel(file_path, sheet_name="1.매매증감", skiprows=[0, 2, 3])
-        rent_chg = pd.read_excel(file_path, sheet_name="2.전세증감", skiprows=[0, 2, 3])
+        sheets = _parse_sheets(file_path)
     except Exception as e:
-        st.error(f"증감 데이터 로드 오류: {e}")
-        return None
+        st.error(f"오류 발생: {e}")
+        st.stop()
+    return {
+        "index": _melt_pair(sheets, "3.매매지수", "4.전세지수", ("매매지수", "전세지수")),
+        "change": _melt_pair(sheets, "1.매매증감", "2.전세증감", ("매매증감", "전세증감")),
+    }
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+@st.cache_resource
+def _load_cached(file_path, name, _loader):
+    # 원본 해시+mtime을 키로 한 파케이 디스크 캐시 — 엑셀이 바뀌면 키가 바뀌어
+    # 자연히 무효화되고, 프로세스가 재시작돼도 ms 단위로 다시 읽을 수 있음
+    src = Path(file_path)
+    key = hashlib.md5(src.read_bytes()).hexdigest() + str(int(src.stat().st_mtime))
+    pq = Path(".cache") / f"{key}.{name}.parquet"
+    if pq.exists():
+        return pd.read_parquet(pq)
+    df = _loader(file_path)
+    try:
+        pq.parent.mkdir(exist_ok=True)
+        df.to_parquet(pq, compression="zstd")
+    except Exception:
+        pass  # 디스크 캐시 실패는 치명적이지 않음
+    return df
 
-    sale_chg = sale_chg.dropna(subset=['구분']).fillna(0).infer_objects(copy=False)
-    rent_chg = rent_chg.dropna(subset=['구분']).fillna(0).infer_objects(copy=False)
+def _rdp_keep(x, y, eps):
+    # Ramer–Douglas–Peucker 경로 단순화: 유지할 점의 마스크를 반환 (반복 스택 방식)
+    n = x.shape[0]
+    keep = np.zeros(n, dtype=np.bool_)
+    keep[0] = True
+    keep[n - 1] = True
+    stack_s = np.empty(n, dtype=np.int64)
+    stack_e = np.empty(n, dtype=np.int64)
+    stack_s[0] = 0
+    stack_e[0] = n - 1
+    top = 1
+    while top > 0:
+        top -= 1
+        s = stack_s[top]
+        e = stack_e[top]
+        if e <= s + 1:
+            continue
+        dx = x[e] - x[s]
+        dy = y[e] - y[s]
+        norm = (dx * dx + dy * dy) ** 0.5
+        dmax = -1.0
+        imax = -1
+        for i in range(s + 1, e):
+            if norm == 0.0:
+                d = ((x[i] - x[s]) ** 2 + (y[i] - y[s]) ** 2) ** 0.5
+            else:
+                d = abs(dy * x[i] - dx * y[i] + x[e] * y[s] - y[e] * x[s]) / norm
+            if d > dmax:
+                dmax = d
+                imax = i
+        if dmax > eps:
+            keep[imax] = True
+            stack_s[top] = s
+            stack_e[top] = imax
+            top += 1
+            stack_s[top] = imax
+            stack_e[top] = e
+            top += 1
+    return keep
+
+@st.cache_resource
+def _get_rdp():
+    # 프로세스당 한 번만 JIT 컴파일. njit(cache=True)의 디스크 캐시는 쓰지 않음 —
+    # 다른 임포트 경로에서 컴파일된 항목을 로드할 때 모듈(스크립트 전체)을
+    # 재임포트해 실행 중인 앱을 죽일 수 있음
+    if njit is None:
+        return _rdp_keep
+    return njit(_rdp_keep)
+
+def _decimate_paths(df_sel, max_points=400):
+    # 긴 경로는 max_points 예산에 맞춰 점을 솎아 브라우저로 보내는 정점 수를 줄임
+    # (시작/끝 점은 항상 유지되므로 엔드포인트 마커/주석은 그대로 맞음)
+    parts = []
+    changed = False
+    for _, g in df_sel.groupby('지역', observed=True, sort=False):
+        n = len(g)
+        if n <= max_points:
+            parts.append(g)
+            continue
+        x = g['매매지수'].to_numpy(np.float64)
+        y = g['전세지수'].to_numpy(np.float64)
+        rdp = _get_rdp()
+        # eps를 이분 탐색해 유지 점수가 예산을 넘지 않는 가장 촘촘한 단순화를 찾음
+        lo, hi = 0.0, max(x.max() - x.min(), y.max() - y.min())
+        keep = rdp(x, y, hi)
+        for _ in range(24):
+            eps = (lo + hi) / 2.0
+            cand = rdp(x, y, eps)
+            if cand.sum() > max_points:
+                lo = eps
+            else:
+                hi = eps
+                keep = cand
+        # 거의 직선인 구간은 RDP만으로는 점이 너무 줄어들므로(마커 밀도 붕괴)
+        # 남는 예산을 균일 간격 점으로 채워 주간 마커 질감을 유지
+        shortfall = max_points - int(keep.sum())
+        if shortfall > 0:
+            keep[np.linspace(0, n - 1, shortfall).astype(np.int64)] = True
+        parts.append(g[keep])
+        changed = True
+    if not changed:
+        return df_sel
+    return pd.concat(parts)
 
-    sale_chg.rename(columns={'구분': '날짜'}, inplace=True)
-    rent_chg.rename(columns={'구분': '날짜'}, inplace=True)
+@st.cache_data
+def _prep(df):
+    # 날짜 정렬 인덱스를 한 번만 만들어 두면 리런마다 O(log N) 슬라이스로 조회 가능
+    df = df.sort_values('날짜').reset_index(drop=True)
+    # hover에는 짧은 ISO 날짜 문자열만 실어 보냄 — HTML 조각은 클라이언트에서 조립하고,
+    # 지역은 trace 이름으로, 지수는 좌표값으로 이미 전달되므로 중복 전송하지 않음.
+    # category는 서버 메모리 절약용이고 직렬화 시에는 문자열 배열로 풀림
+    df['날짜_str'] = df['날짜'].dt.strftime('%Y-%m-%d').astype('category')
+    return df.set_index('날짜')
 
-    s_melt = sale_chg.melt(id_vars=['날짜'], var_name='지역', value_name='매매증감')
-    r_melt = rent_chg.melt(id_vars=['날짜'], var_name='지역', value_name='전세증감')
+@st.cache_data
+def _prep_chg(df_chg):
+    # 증감 프레임도 날짜 정렬 인덱스로 만들어 불리언 마스크 대신 슬라이스로 조회
+    return df_chg.sort_values('날짜').set_index('날짜', drop=False)
 
-    df_chg = pd.merge(s_melt, r_melt, on=['날짜', '지역'])
-    df_chg['날짜'] = pd.to_datetime(df_chg['날짜'])
-    return df_chg
-#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+@st.cache_data
+def _regions(df):
+    return df['지역'].unique().tolist()
 
 file_path = "주간시계열.xlsx"
 logo_image_path = "jak_logo.png"
-df = load_data(file_path)
+default_colors = px.colors.qualitative.Plotly
+df = _load_cached(file_path, "index", lambda p: load_all(p)["index"])
 
-# 데이터 로드 실행++++++++++++++++++++++++++++++++++++++++  
-df_chg = load_change_data(file_path)
+# 데이터 로드 실행++++++++++++++++++++++++++++++++++++++++
+df_chg = _load_cached(file_path, "change", lambda p: load_all(p)["change"])
 #++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 # --- 사이드바 ---
@@ -79,11 +228,14 @@ if len(selected_dates) != 2:
     st.stop()
 start_date, end_date = selected_dates
 
-all_regions = df["지역"].unique()
+all_regions = _regions(df)
 selected_regions = st.sidebar.multiselect("지역 선택", options=all_regions, default=all_regions[:3])
 
+resolution = st.sidebar.radio("해상도", ["자동", "주간", "월간"], horizontal=True,
+                              help="자동: 2년 초과 구간은 월간으로 표시")
+
 st.sidebar.header("🎨 색상")
-color_map = {reg: st.sidebar.color_picker(f"{reg}", px.colors.qualitative.Plotly[i%10]) 
+color_map = {reg: st.sidebar.color_picker(f"{reg}", default_colors[i%10])
              for i, reg in enumerate(selected_regions)}
 
 col1, col2 = st.columns([1, 8]) 
@@ -97,77 +249,104 @@ with col1:
 with col2:
     st.title("작부동산 매전지수 사분면")
 
-mask = (df["날짜"] >= pd.to_datetime(start_date)) & \
-       (df["날짜"] <= pd.to_datetime(end_date)) & \
-       (df["지역"].isin(selected_regions))
-df_sel = df[mask].sort_values(['지역', '날짜'])
-
-if df_sel.empty:
-    st.warning("데이터가 없습니다.")
-else:
-    fig = go.Figure()
-
+start_ts = pd.Timestamp(start_date)
+end_ts = pd.Timestamp(end_date)
+
+prepped = _prep(df)
+sub = prepped.loc[start_ts:end_ts]
+# 그림에 쓰는 열만 골라 담아 리런마다 복사/직렬화되는 양을 최소화
+df_sel = sub.loc[sub["지역"].isin(selected_regions),
+                 ['지역', '매매지수', '전세지수', '날짜_str']]
+
+# 장기 구간은 월 단위로 낮춰 브라우저로 보내는 정점 수를 ~4배 줄임
+if resolution == "월간" or (resolution == "자동" and (end_date - start_date).days > 730):
+    df_sel = (df_sel.groupby('지역', observed=True)
+                    .resample('MS')
+                    .last()
+                    .reset_index(level='지역')
+                    .dropna(subset=['매매지수']))
+
+df_sel = _decimate_paths(df_sel)
+
+@st.cache_data(max_entries=16)
+def _build_quadrant_fig(filter_key, color_key, _df_sel):
+    # 필터/색상이 같으면 그림 전체(JSON)를 재사용 — 무관한 위젯 조작 시 재구성 생략
+    start_date, end_date, selected_regions = filter_key[0], filter_key[1], list(filter_key[2])
+    color_map = dict(color_key)
+    df_sel = _df_sel
+
+    # px.line의 내부 groupby/검증/재인코딩을 생략하고 trace를 직접 구성
+    # (Series 대신 numpy 배열을 넘기면 인덱스 직렬화도 빠짐)
+    groups = dict(list(df_sel.groupby('지역', sort=False, observed=True)))
+    traces = []
     for region in selected_regions:
-        rdf = df_sel[df_sel['지역'] == region]
-        if rdf.empty: continue
-        
-        reg_color = color_map.get(region, "black")
-
-        fig.add_trace(go.Scatter(
-            x=rdf['매매지수'], y=rdf['전세지수'],
-            mode='lines+markers',
-            name=region,
-            line=dict(color=reg_color, width=2),
+        rdf = groups.get(region)
+        if rdf is None or rdf.empty:
+            continue
+        traces.append(go.Scattergl(
+            x=rdf['매매지수'].to_numpy(), y=rdf['전세지수'].to_numpy(),
+            mode='lines+markers', name=region,
+            line=dict(color=color_map.get(region, "black"), width=2),
             marker=dict(size=4, opacity=0.5),
-            hoverinfo='text',
-            text=[f"{region}<br>{d.strftime('%Y-%m-%d')}<br>매매:{s}<br>전세:{r}" 
-                  for d, s, r in zip(rdf['날짜'], rdf['매매지수'], rdf['전세지수'])]
+            customdata=rdf['날짜_str'].to_numpy(),
+            hovertemplate='%{customdata}<br>매매:%{x}<br>전세:%{y}',
         ))
-        
-        last = rdf.iloc[-1]
-        fig.add_annotation(
-            x=last['매매지수'], y=last['전세지수'],
-            text=f"<b>{region} (최근)</b>",
-            showarrow=False, yshift=15,
-            font=dict(color="white", size=11),
-            bgcolor=reg_color, borderpad=4, opacity=1
-        )
+    fig = go.Figure(data=traces)
 
-        last = rdf.iloc[-1]
-        fig.add_trace(go.Scatter(
-            x=[last['매매지수']], y=[last['전세지수']],
-            mode='markers+text',
-            text=["recent"], 
-            textposition="top center", 
-            marker=dict(color=reg_color, size=10, symbol="circle"), 
-            showlegend=False
-        ))
+    # 시작/최근 지점은 groupby 한 번으로 모아서 trace 2개로 표시
+    g = df_sel.groupby('지역', sort=False, observed=True)
+    firsts = g.head(1)
+    lasts = g.tail(1)
 
-        first = rdf.iloc[0]
-        fig.add_trace(go.Scatter(
-            x=[first['매매지수']], y=[first['전세지수']],
+    fig.add_traces([
+        go.Scattergl(
+            x=firsts['매매지수'], y=firsts['전세지수'],
             mode='markers+text',
-            text=["START"], textposition="bottom center",
-            marker=dict(color="grey", size=8, symbol="circle"),
+            text=["시작"] * len(firsts), textposition="bottom center",
+            marker=dict(color="lightgrey", size=8, symbol="circle"),
             showlegend=False
-        ))
-
+        ),
+        go.Scattergl(
+            x=lasts['매매지수'], y=lasts['전세지수'],
+            mode='markers',
+            marker=dict(size=12, color=[color_map.get(r, "black") for r in lasts['지역']],
+                        line=dict(width=2, color="white")),
+            showlegend=False
+        ),
+    ])
     fig.update_layout(
         title=f"jak 작부동산 지수 경로 분석 ({start_date} ~ {end_date})",
         xaxis_title="매매지수", yaxis_title="전세지수",
         template="plotly_white",
         height=700,
-        hovermode="closest"
+        hovermode="closest",
+        # 리런 간 줌/팬과 WebGL 상태를 유지해 plotly.js가 데이터만 diff하게 함
+        uirevision="realestate-4q",
+        annotations=[
+            dict(x=row.매매지수, y=row.전세지수,
+                 text=f"<b>{row.지역} (최근)</b>",
+                 showarrow=False, yshift=15,
+                 font=dict(color="white", size=11),
+                 bgcolor=color_map.get(row.지역, "black"), borderpad=4, opacity=1)
+            for row in lasts.itertuples(index=False)
+        ]
     )
 
-    st.plotly_chart(fig, use_container_width=True)
+    return fig.to_json()
+
+if df_sel.empty:
+    st.warning("데이터가 없습니다.")
+else:
+    filter_key = (str(start_date), str(end_date), tuple(selected_regions), resolution)
+    color_key = tuple(sorted(color_map.items()))
+    fig_json = _build_quadrant_fig(filter_key, color_key, df_sel)
+    st.plotly_chart(go.Figure(json.loads(fig_json)), use_container_width=True,
+                    key="main-plot")
 
 
 st.divider() 
-mask_chg = (df_chg["날짜"] >= pd.to_datetime(start_date)) & \
-           (df_chg["날짜"] <= pd.to_datetime(end_date)) & \
-           (df_chg["지역"].isin(selected_regions))
-df_chg_sel = df_chg[mask_chg].sort_values(['날짜', '지역'])
+sub_chg = _prep_chg(df_chg).loc[start_ts:end_ts]
+df_chg_sel = sub_chg[sub_chg["지역"].isin(selected_regions)]
 
 
 if df_chg_sel.empty:
@@ -184,10 +363,13 @@ else:
 
     st.write(f"######  jak 작부동산 지역별 매매/전세 증감률 ({start_date} ~ {end_date})")
 
+    # 지역별 boolean 마스크 N번 대신 groupby 한 번으로 분할
+    groups = dict(list(df_bar.groupby('지역', observed=True, sort=False)))
+
     for region in selected_regions:
-        region_df = df_bar[df_bar['지역'] == region]
-        
-        if region_df.empty:
+        region_df = groups.get(region)
+
+        if region_df is None or region_df.empty:
             continue
             
         fig_each = px.bar(
@@ -213,7 +395,7 @@ else:
         fig_each.update_xaxes(type='category', tickangle=35)
         fig_each.add_hline(y=0, line_width=1, line_color="black")
 
-        st.plotly_chart(fig_each, use_container_width=True)
+        st.plotly_chart(fig_each, use_container_width=True, key=f"chg-{region}")
 
 
 